@@ -2,8 +2,8 @@ import os
 from pathlib import Path
 import streamlit as st
 from rag_agent.retriever import Retriever
-from rag_agent.agent import CaseFile, run_agent, submit_feedback
-from rag_agent.llm import NvidiaChatClient
+from rag_agent.agent import CaseFile, analyze_and_stream, submit_feedback, warmup_agent
+from rag_agent.llm import NvidiaChatClient, sanitize_output
 
 ROOT = Path(__file__).parent
 DATA = ROOT / "data" / "corpus.json"
@@ -11,14 +11,24 @@ DATA = ROOT / "data" / "corpus.json"
 @st.cache_resource
 def get_retriever():
     docs = Retriever.load_docs(str(DATA))
-    return Retriever(docs)
+    r = Retriever(docs, cache_dir=str(DATA.parent))
+    warmup_agent(r)  # at startup, not on the first Run click
+    return r
 
 @st.cache_resource
 def get_client():
     return NvidiaChatClient()
 
+def show_error(label: str, e: Exception) -> None:
+    import traceback
+    st.error(f"{label}: {e}")
+    st.caption("If this persists, check your NVIDIA API key, model, or try again later.")
+    st.expander("Show traceback").write(traceback.format_exc())
+    st.stop()
+
 st.set_page_config(page_title="Legal Intelligence Agent", layout="wide")
 st.title("Legal Intelligence Agentic System (RAG + NVIDIA LLM)")
+get_retriever()  # load and warm the cached retriever as soon as the app starts
 
 with st.sidebar:
     st.markdown("### API Configuration")
@@ -49,15 +59,13 @@ if st.button("Run Agent", type="primary"):
     retriever = get_retriever()
     client = get_client()
     case = CaseFile(title=title, facts=facts, issues_hint=issues_hint)
-    with st.spinner("Running agent..."):
+    with st.spinner("Retrieving precedents..."):
         try:
-            result = run_agent(retriever, case, client, temperature=temp, max_tokens=int(max_toks))
+            # the draft request is sent right after retrieval and streams below
+            result, draft_chunks = analyze_and_stream(retriever, case, client, temperature=temp,
+                                                      max_tokens=int(max_toks))
         except Exception as e:
-            import traceback
-            st.error(f"LLM API error: {e}")
-            st.caption("If this persists, check your NVIDIA API key, model, or try again later.")
-            st.expander("Show traceback").write(traceback.format_exc())
-            st.stop()
+            show_error("Agent error", e)
     st.subheader("Issues")
     st.write(", ".join(result["issues"]))
 
@@ -82,6 +90,15 @@ if st.button("Run Agent", type="primary"):
                 st.caption(f"  • {ev['source']}: {ev['snippet']}")
 
     st.subheader("Draft")
+    # Stream tokens as they arrive, then swap in the sanitized text once complete
+    live = st.empty()
+    try:
+        with live.container():
+            streamed = st.write_stream(draft_chunks)
+    except Exception as e:
+        show_error("LLM API error", e)
+    live.empty()
+    result["draft"] = sanitize_output(streamed if isinstance(streamed, str) else "".join(map(str, streamed)))
     # Render as plain text (no markdown) in a read-only area, with download option
     st.text_area("Draft", result["draft"], height=480)
     st.download_button(
@@ -1,8 +1,13 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterator, Tuple
 from dataclasses import dataclass
-from .retriever import Retriever
-from .llm import NvidiaChatClient, generate_legal_brief
+from functools import lru_cache
+import queue
+import re
+import threading
+import numpy as np
+from .retriever import Retriever, KEY_TERMS
+from .llm import NvidiaChatClient, generate_legal_brief, sanitize_output, stream_legal_brief
 from .feedback import get_style_flags, record_feedback
 import os
 
@@ -60,42 +65,53 @@ def plan_steps(issues: List[str]) -> List[str]:
 
 def evidence_check(claims: List[str], top_docs: List[Dict[str, Any]]) -> List[Tuple[str, List[str]]]:
     results = []
+    # scan each doc once (not per claim); works for any dict with "text", not just retrieve() output
+    kt_re = _terms_re(KEY_TERMS)
+    doc_cites = [f"{d['title']} ({d['year']})" for d in top_docs if kt_re.search(d["text"])]
     for c in claims:
         c_l = c.lower()
         cites: List[str] = []
-        for d in top_docs:
-            txt = d["text"].lower()
-            if any(k in c_l for k in ["privacy", "proportionality", "necessity", "safeguards", "biometric", "article 21"]):
-                if any(w in txt for w in ["privacy", "proportionality", "necessity", "safeguards", "biometric", "article 21"]):
-                    cites.append(f"{d['title']} ({d['year']})")
+        if any(k in c_l for k in KEY_TERMS):
+            cites = doc_cites
         cites = sorted(list(dict.fromkeys(cites)))
         results.append((c, cites))
     return results
 
 
+_ISSUE_LABELS = {
+    "privacy": "Article 21 privacy",
+    "proportionality": "Proportionality test",
+    "biometric": "Biometric intrusion",
+    "safeguards": "Procedural safeguards",
+    "legality": "Legality / enabling law",
+    "religion": "Article 25 religion",
+    "expression": "Article 19(1)(a) expression",
+    "trade": "Article 19(1)(g) trade/business",
+    "equality": "Article 14 equality / arbitrariness",
+    "assembly": "Article 19(1)(b) assembly",
+    "internet": "Internet access / shutdowns",
+    "localization": "Data localization",
+    "surveillance": "State surveillance / public safety",
+}
+_PRIORITY = (
+    "legality","privacy","proportionality","religion","expression","trade",
+    "equality","assembly","biometric","surveillance","internet","localization","safeguards",
+)
+_PRIORITY_INDEX = {k: i for i, k in enumerate(_PRIORITY)}
+_RISK_TERMS = ("blanket", "mandatory", "indefinite", "mass", "facial recognition", "biometric", "shutdown", "localization")
+_SAFE_TERMS = ("safeguard", "oversight", "exemption", "opt-out", "purpose limitation", "data minimization", "sunset")
+
+
+@lru_cache(maxsize=8)
+def _terms_re(key_terms: Tuple[str, ...]) -> re.Pattern:
+    # ASCII-only case folding, like _ISSUE_RE: "ſ" must not match "s" where a lower()/in check would not
+    return re.compile("|".join(re.escape(k) for k in key_terms), re.IGNORECASE | re.ASCII)
+
+
 def _pretty_issues(kws: List[str]) -> List[str]:
-    label_map = {
-        "privacy": "Article 21 privacy",
-        "proportionality": "Proportionality test",
-        "biometric": "Biometric intrusion",
-        "safeguards": "Procedural safeguards",
-        "legality": "Legality / enabling law",
-        "religion": "Article 25 religion",
-        "expression": "Article 19(1)(a) expression",
-        "trade": "Article 19(1)(g) trade/business",
-        "equality": "Article 14 equality / arbitrariness",
-        "assembly": "Article 19(1)(b) assembly",
-        "internet": "Internet access / shutdowns",
-        "localization": "Data localization",
-        "surveillance": "State surveillance / public safety",
-    }
-    priority = [
-        "legality","privacy","proportionality","religion","expression","trade",
-        "equality","assembly","biometric","surveillance","internet","localization","safeguards",
-    ]
     # Keep order by priority and only include detected keys
-    ordered = [k for k in priority if k in kws]
-    labels = [label_map.get(k, k) for k in ordered]
+    ordered = sorted(_PRIORITY_INDEX.keys() & set(kws), key=_PRIORITY_INDEX.__getitem__)
+    labels = [_ISSUE_LABELS.get(k, k) for k in ordered]
     return labels[:5] if labels else []
 
 
@@ -103,18 +119,22 @@ def _verdict_confidence(query: str, retrieved: List[Dict[str, Any]]) -> float:
     # Base on top precedent support
     s = sum(d["score"] for d in retrieved[:2]) / max(1, len(retrieved[:2]))
     conf = 0.4 + 0.5 * (s - 0.5)  # center near 0.4..0.9 with s~[0.5..1]
-    q = query.lower()
-    risk_terms = ["blanket", "mandatory", "indefinite", "mass", "facial recognition", "biometric", "shutdown", "localization"]
-    safe_terms = ["safeguard", "oversight", "exemption", "opt-out", "purpose limitation", "data minimization", "sunset"]
-    if any(t in q for t in risk_terms):
+    # one regex scan per term list; ASCII case-insensitive substring matches, same as query.lower() + `in`
+    if _terms_re(_RISK_TERMS).search(query):
         conf += 0.05
-    if any(t in q for t in safe_terms):
+    if _terms_re(_SAFE_TERMS).search(query):
         conf -= 0.05
     return float(max(0.5, min(0.9, conf)))
 
 
-def draft_arguments(case_file: CaseFile, top_docs: List[Dict[str, Any]], client: NvidiaChatClient,
-                    temperature: float = 0.3, max_tokens: int = 1600, style_preference: str | None = None) -> str:
+def _case_text(case_file: CaseFile) -> str:
+    # what the semantic cache embeds: the case itself, not the fixed instructions/precedents
+    return f"{case_file.title}. {case_file.facts}"
+
+
+def _brief_parts(case_file: CaseFile, top_docs: List[Dict[str, Any]],
+                 style_preference: str | None = None) -> Tuple[str, str]:
+    # (prompt, context); context is everything but the case, i.e. what a reused cached draft must share
     fb = get_style_flags()
     prefix = style_prefix(fb, style_preference=style_preference)
     grounds = "\n".join([f"- {d['title']} ({d['year']}): {d['text']}" for d in top_docs[:4]])
@@ -134,54 +154,101 @@ WRITE THE BRIEF WITH THESE EXACT SECTIONS:
 5) Verdict — a single sentence and a numeric confidence in [0,1].
 Be specific; avoid boilerplate and repetition. Do not include any hidden reasoning or meta commentary.
 """
-    return generate_legal_brief(prompt, client, temperature=temperature, max_tokens=max_tokens)
+    return prompt, f"{prefix}\n{grounds}"
+
+
+def brief_prompt(case_file: CaseFile, top_docs: List[Dict[str, Any]], style_preference: str | None = None) -> str:
+    return _brief_parts(case_file, top_docs, style_preference=style_preference)[0]
+
+
+def draft_arguments(case_file: CaseFile, top_docs: List[Dict[str, Any]], client: NvidiaChatClient,
+                    temperature: float = 0.3, max_tokens: int = 1600, style_preference: str | None = None) -> str:
+    prompt, context = _brief_parts(case_file, top_docs, style_preference=style_preference)
+    return generate_legal_brief(prompt, client, temperature=temperature, max_tokens=max_tokens,
+                                cache_text=_case_text(case_file), cache_context=context)
+
+
+def stream_arguments(case_file: CaseFile, top_docs: List[Dict[str, Any]], client: NvidiaChatClient,
+                     temperature: float = 0.3, max_tokens: int = 1600, style_preference: str | None = None,
+                     stream: bool = True) -> Iterator[str]:
+    # Streaming variant of draft_arguments; sanitize_output the joined chunks afterwards
+    prompt, context = _brief_parts(case_file, top_docs, style_preference=style_preference)
+    return stream_legal_brief(prompt, client, temperature=temperature, max_tokens=max_tokens, stream=stream,
+                              cache_text=_case_text(case_file), cache_context=context)
 
 
 def _extract_snippet(text: str, key_terms: List[str], window: int = 140) -> str | None:
-    tl = text.lower()
-    for k in key_terms:
-        i = tl.find(k)
-        if i != -1:
-            start = max(0, i - window//2)
-            end = min(len(text), i + window//2)
-            snippet = text[start:end].strip()
-            return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
-    return None
+    # one C-level scan for the earliest occurrence of any key term
+    m = _terms_re(tuple(key_terms)).search(text)
+    if not m:
+        return None
+    i = m.start()
+    start = max(0, i - window//2)
+    end = min(len(text), i + window//2)
+    snippet = text[start:end].strip()
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
 
 
-def run_agent(retriever: Retriever, case_file: CaseFile, client: NvidiaChatClient,
-              temperature: float | None = None, max_tokens: int | None = None,
-              style_preference: str | None = None) -> Dict[str, Any]:
+CLAIMS_PROBE = (
+    "Privacy is a fundamental right under Article 21.",
+    "Any limitation must satisfy proportionality including necessity.",
+    "Blanket biometric mandates are intrusive and require robust safeguards.",
+    "Legality requires clear statutory backing and oversight.",
+)
+# KEY_TERMS columns each claim mentions; a claim naming none is grounded by any key term
+_CLAIM_COLS = tuple(
+    [j for j, k in enumerate(KEY_TERMS) if k in c.lower()] or list(range(len(KEY_TERMS)))
+    for c in CLAIMS_PROBE
+)
+
+
+def warmup_agent(retriever: Retriever) -> None:
+    # Startup warm-up: a retrieval pass plus the probe-claim vectors, so the first request encodes only its query
+    retriever.warmup()
+    retriever.encode_fixed(CLAIMS_PROBE)
+
+
+def _retrieve_step(retriever: Retriever, case_file: CaseFile) -> Tuple[str, List[str], np.ndarray, List[Dict[str, Any]]]:
     query = f"{case_file.title}. {case_file.facts}"
     # Detect issues from the provided facts/title only for variety
     raw_issues = retriever._issue_keywords(query)
+    retrieved = retriever.retrieve(query, k=5)
+    # the probe claims never change: encoded once, reused across requests
+    claim_vecs = retriever.encode_fixed(CLAIMS_PROBE)
+    return query, raw_issues, claim_vecs, retrieved
+
+
+def _ground_step(retriever: Retriever, query: str, raw_issues: List[str], claim_vecs: np.ndarray,
+                 retrieved: List[Dict[str, Any]]) -> Dict[str, Any]:
     issues = _pretty_issues(raw_issues)
     steps = plan_steps(raw_issues)
-    retrieved = retriever.retrieve(query, k=5)
-    claims_probe = [
-        "Privacy is a fundamental right under Article 21.",
-        "Any limitation must satisfy proportionality including necessity.",
-        "Blanket biometric mandates are intrusive and require robust safeguards.",
-        "Legality requires clear statutory backing and oversight.",
-    ]
+    # claim x retrieved-doc cosine similarity, used to order evidence per claim
+    rows = [retriever.doc_pos[d["id"]] for d in retrieved]
+    claim_sims = claim_vecs @ retriever.doc_vectors(rows).T  # shape (C, k)
+    # (k, T) key-term bitmask of the retrieved docs
+    kt_mask = retriever._kt_mask[rows]
     # simple grounding by titles/years
     grounding = []
     # pinpoint grounding snippets
     grounding_snippets: List[Dict[str, Any]] = []
-    key_terms = ["privacy", "proportionality", "necessity", "safeguards", "biometric", "article 21"]
-    for c in claims_probe:
-        cites = [f"{d['title']} ({d['year']})" for d in retrieved if any(w in d['text'].lower() for w in key_terms)]
+    sources = [f"{d['title']} ({d['year']})" for d in retrieved]
+    for ci, c in enumerate(CLAIMS_PROBE):
+        # docs mentioning any of the key terms this claim is about
+        hits = kt_mask[:, _CLAIM_COLS[ci]].any(axis=1)
+        cites = [sources[j] for j in np.flatnonzero(hits).tolist()]
         grounding.append((c, sorted(list(dict.fromkeys(cites)))))
+        # anchor each snippet on this claim's own terms
+        claim_terms = [KEY_TERMS[j] for j in _CLAIM_COLS[ci]]
         evidences = []
-        for d in retrieved:
-            snip = _extract_snippet(d["text"], key_terms)
+        for j in np.argsort(-claim_sims[ci]).tolist():
+            if not hits[j]:
+                continue
+            snip = _extract_snippet(retrieved[j]["text"], claim_terms)
             if snip:
-                evidences.append({"source": f"{d['title']} ({d['year']})", "snippet": snip})
-        grounding_snippets.append({"claim": c, "evidence": evidences[:3]})
-    # apply provided temperature/max_tokens if given, else keep existing defaults
-    t = 0.35 if temperature is None else float(temperature)
-    mt = 1700 if max_tokens is None else int(max_tokens)
-    draft = draft_arguments(case_file, retrieved, client, temperature=t, max_tokens=mt, style_preference=style_preference)
+                evidences.append({"source": sources[j], "snippet": snip})
+                if len(evidences) >= 3:
+                    break
+        grounding_snippets.append({"claim": c, "evidence": evidences})
     conf = _verdict_confidence(query, retrieved)
     return {
         "issues": issues,
@@ -189,11 +256,70 @@ def run_agent(retriever: Retriever, case_file: CaseFile, client: NvidiaChatClien
         "retrieved": retrieved,
         "grounding": grounding,
         "grounding_snippets": grounding_snippets,
-        "draft": draft,
+        "draft": "",
         "confidence": round(float(conf), 2),
         "used_doc_ids": [d["id"] for d in retrieved[:4]],
     }
 
 
+def analyze_case(retriever: Retriever, case_file: CaseFile) -> Dict[str, Any]:
+    # Everything run_agent does except drafting; "draft" is left empty for the caller to fill
+    return _ground_step(retriever, *_retrieve_step(retriever, case_file))
+
+
+def _prefetch(chunks: Iterator[str]) -> Iterator[str]:
+    # Drive the chunk generator (i.e. send the LLM request) on a background thread right away;
+    # the returned iterator replays its chunks and re-raises its error in the caller's thread
+    q: queue.Queue = queue.Queue()
+    done = object()
+
+    def pump() -> None:
+        try:
+            for piece in chunks:
+                q.put(piece)
+        except BaseException as e:
+            q.put(e)
+        finally:
+            q.put(done)
+
+    threading.Thread(target=pump, daemon=True).start()
+
+    def drain() -> Iterator[str]:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    return drain()
+
+
+def analyze_and_stream(retriever: Retriever, case_file: CaseFile, client: NvidiaChatClient,
+                       temperature: float = 0.3, max_tokens: int = 1600, style_preference: str | None = None,
+                       stream: bool = True) -> Tuple[Dict[str, Any], Iterator[str]]:
+    # analyze_case + stream_arguments, with the LLM request in flight while grounding runs.
+    # Returns the analysis ("draft" empty) and the draft chunks; sanitize_output the joined chunks.
+    query, raw_issues, claim_vecs, retrieved = _retrieve_step(retriever, case_file)
+    chunks = _prefetch(stream_arguments(case_file, retrieved, client, temperature=temperature,
+                                        max_tokens=max_tokens, style_preference=style_preference, stream=stream))
+    result = _ground_step(retriever, query, raw_issues, claim_vecs, retrieved)
+    return result, chunks
+
+
+def run_agent(retriever: Retriever, case_file: CaseFile, client: NvidiaChatClient,
+              temperature: float | None = None, max_tokens: int | None = None,
+              style_preference: str | None = None) -> Dict[str, Any]:
+    # apply provided temperature/max_tokens if given, else keep existing defaults
+    t = 0.35 if temperature is None else float(temperature)
+    mt = 1700 if max_tokens is None else int(max_tokens)
+    # synchronous, so it also works inside a running event loop; the draft request still overlaps grounding
+    result, chunks = analyze_and_stream(retriever, case_file, client, temperature=t, max_tokens=mt,
+                                        style_preference=style_preference, stream=False)
+    result["draft"] = sanitize_output("".join(chunks))
+    return result
+
+
 def submit_feedback(thumbs_up: bool, used_doc_ids: List[str], notes: str = "") -> Dict[str, Any]:
     return record_feedback(thumbs_up, used_doc_ids=used_doc_ids, notes=notes)
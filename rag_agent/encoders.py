@@ -0,0 +1,37 @@
+from __future__ import annotations
+import os
+from functools import lru_cache
+from typing import Any
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+# Shared sentence encoders: the retriever and the LLM semantic cache get the same
+# instance per model name, so the MiniLM weights and tokenizer are loaded once per process.
+
+DEFAULT_ENCODER = "sentence-transformers/all-MiniLM-L6-v2"
+# Directory produced by scripts/export_minilm_onnx.py; when set, DEFAULT_ENCODER is encoded via
+# ONNX Runtime instead of PyTorch (other model names always load through sentence-transformers)
+RETRIEVER_ONNX_DIR = os.environ.get("RETRIEVER_ONNX_DIR")
+
+
+def _uses_onnx(name: str) -> bool:
+    # the exported ONNX model is MiniLM, so it only stands in for that model
+    return bool(RETRIEVER_ONNX_DIR) and name == DEFAULT_ENCODER
+
+
+def encoder_id(name: str = DEFAULT_ENCODER) -> str:
+    # Identifies what actually produces the vectors (used to key on-disk embedding caches)
+    return f"onnx:{RETRIEVER_ONNX_DIR}" if _uses_onnx(name) else name
+
+
+def get_encoder(name: str = DEFAULT_ENCODER) -> Any:
+    # normalize to a positional call so get_encoder() and get_encoder(DEFAULT_ENCODER) share a cache entry
+    return _load_encoder(name)
+
+
+@lru_cache(maxsize=None)
+def _load_encoder(name: str) -> Any:
+    if _uses_onnx(name):
+        from .onnx_encoder import OnnxMiniLM
+        return OnnxMiniLM(RETRIEVER_ONNX_DIR)
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
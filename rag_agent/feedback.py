@@ -1,8 +1,9 @@
 # filepath: /Users/avinash/Desktop/works/legal_intelligence_agent/rag_agent/feedback.py
 from __future__ import annotations
 import os
-import json
-from typing import Dict, List
+import copy
+from typing import Any, Dict, List
+from .jsonio import atomic_write_bytes, dumps, loads
 
 FEEDBACK_PATH = os.environ.get("FEEDBACK_PATH", "legal_feedback.json")
 
@@ -15,25 +16,44 @@ DEFAULT_FEEDBACK = {
 }
 
 
-def _load() -> Dict:
+# In-process copy of the feedback file, refreshed only when its mtime changes
+_CACHE: Dict[str, Any] = {"mtime": None, "data": None, "boosts": None}
+
+
+def _mtime() -> float | None:
+    try:
+        return os.path.getmtime(FEEDBACK_PATH)
+    except OSError:
+        return None
+
+
+def _read() -> Dict:
     if os.path.exists(FEEDBACK_PATH):
         try:
-            with open(FEEDBACK_PATH, "r") as f:
-                data = json.load(f)
-                for k, v in DEFAULT_FEEDBACK.items():
-                    data.setdefault(k, v)
-                return data
+            with open(FEEDBACK_PATH, "rb") as f:
+                data = loads(f.read())
+            for k, v in DEFAULT_FEEDBACK.items():
+                data.setdefault(k, copy.deepcopy(v))
+            return data
         except Exception:
-            return DEFAULT_FEEDBACK.copy()
-    return DEFAULT_FEEDBACK.copy()
+            return copy.deepcopy(DEFAULT_FEEDBACK)
+    return copy.deepcopy(DEFAULT_FEEDBACK)
+
+
+def _load() -> Dict:
+    mtime = _mtime()
+    if _CACHE["data"] is None or _CACHE["mtime"] != mtime:
+        _CACHE.update(mtime=mtime, data=_read(), boosts=None)
+    return _CACHE["data"]
 
 
 def _save(data: Dict) -> None:
     try:
-        with open(FEEDBACK_PATH, "w") as f:
-            json.dump(data, f, indent=2)
+        atomic_write_bytes(FEEDBACK_PATH, dumps(data))
     except Exception:
         pass
+    # keep serving the in-memory copy; it is the latest state even if the write failed
+    _CACHE.update(mtime=_mtime(), data=data, boosts=None)
 
 
 def get_style_flags() -> Dict[str, int]:
@@ -47,13 +67,16 @@ def get_style_flags() -> Dict[str, int]:
 
 def get_doc_boosts() -> Dict[str, float]:
     d = _load()
-    boosts = d.get("doc_boosts", {})
-    # ensure numeric floats
-    return {str(k): float(v) for k, v in boosts.items()}
+    if _CACHE["boosts"] is None:
+        boosts = d.get("doc_boosts", {})
+        # ensure numeric floats
+        _CACHE["boosts"] = {str(k): float(v) for k, v in boosts.items()}
+    return _CACHE["boosts"]
 
 
 def record_feedback(thumbs_up: bool, used_doc_ids: List[str] | None = None, notes: str = "") -> Dict:
-    data = _load()
+    # work on a private copy: the cached dict may be read concurrently; _save installs the new one
+    data = copy.deepcopy(_load())
     # Style adaptation: reward citations and proportionality if liked; nudge bullets if disliked
     if thumbs_up:
         data["style_citations"] = min(2, int(data.get("style_citations", 1)) + 1)
@@ -1,8 +1,9 @@
 import os
 import sys
 import re
-from typing import Dict, Any, Iterable
+from typing import Dict, Any, Iterable, Iterator, Tuple
 from openai import OpenAI
+from .semcache import SemanticCache, cache_key, get_semcache
 
 # NVIDIA Inference API via OpenAI-compatible client.
 # Uses environment variables for configuration:
@@ -15,9 +16,12 @@ NVIDIA_API_KEY = os.environ.get("NVIDIA_API_KEY")
 DEFAULT_MODEL = os.environ.get("NVIDIA_MODEL", "nvidia/llama-3.3-nemotron-super-49b-v1.5")
 
 
+_THINK_RE = re.compile(r"<think>[\s\S]*?</think>", re.IGNORECASE)
+
+
 def sanitize_output(text: str) -> str:
     # Remove any accidental chain-of-thought disclosures like <think>...</think>
-    text = re.sub(r"<think>[\s\S]*?</think>", "", text, flags=re.IGNORECASE)
+    text = _THINK_RE.sub("", text)
     # Trim extra whitespace
     return text.strip()
 
@@ -67,19 +71,60 @@ class NvidiaChatClient:
         return sanitize_output("".join(chunks))
 
 
-def generate_legal_brief(prompt: str, client: NvidiaChatClient, temperature: float = 0.3, max_tokens: int = 1600) -> str:
-    system_rules = (
-        "You are a concise Indian constitutional law analyst. "
-        "Do not reveal chain-of-thought or internal reasoning. "
-        "Never output <think> blocks or similar. "
-        "Avoid boilerplate, disclaimers, and repetition. "
-        "Use only the requested section headings. "
-        "Prefer 1–3 tight bullets per list; keep each bullet under ~25 words. "
-        "Cite only the provided titles and years; no footnotes or URLs. "
-        "Output plain text only — no Markdown, no code fences, no formatting syntax."
-    )
-    messages = [
-        {"role": "system", "content": system_rules},
+SYSTEM_RULES = (
+    "You are a concise Indian constitutional law analyst. "
+    "Do not reveal chain-of-thought or internal reasoning. "
+    "Never output <think> blocks or similar. "
+    "Avoid boilerplate, disclaimers, and repetition. "
+    "Use only the requested section headings. "
+    "Prefer 1–3 tight bullets per list; keep each bullet under ~25 words. "
+    "Cite only the provided titles and years; no footnotes or URLs. "
+    "Output plain text only — no Markdown, no code fences, no formatting syntax."
+)
+
+
+def _brief_messages(prompt: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_RULES},
         {"role": "user", "content": prompt},
     ]
-    return client.chat_text(messages=messages, temperature=temperature, max_tokens=max_tokens)
+
+
+def _cache_lookup(prompt: str, client: NvidiaChatClient, temperature: float, max_tokens: int,
+                  cache_text: str | None, cache_context: str | None) -> Tuple[SemanticCache | None, Any, str, str | None]:
+    # Reuse a stored completion for a near-identical cache_text with the same settings and
+    # cache_context (the prompt minus the case); without a context the whole prompt must match
+    cache = get_semcache()
+    if cache is None:
+        return None, None, "", None
+    key = cache_key(client.model, temperature, max_tokens, prompt if cache_context is None else cache_context)
+    qv = cache.encode(cache_text or prompt)
+    return cache, qv, key, cache.lookup(qv, key)
+
+
+def generate_legal_brief(prompt: str, client: NvidiaChatClient, temperature: float = 0.3, max_tokens: int = 1600,
+                         cache_text: str | None = None, cache_context: str | None = None) -> str:
+    cache, qv, key, hit = _cache_lookup(prompt, client, temperature, max_tokens, cache_text, cache_context)
+    if hit is not None:
+        return hit
+    text = client.chat_text(messages=_brief_messages(prompt), temperature=temperature, max_tokens=max_tokens)
+    if cache is not None and text:
+        cache.add(qv, key, prompt, text)
+    return text
+
+
+def stream_legal_brief(prompt: str, client: NvidiaChatClient, temperature: float = 0.3, max_tokens: int = 1600,
+                       stream: bool = True, cache_text: str | None = None,
+                       cache_context: str | None = None) -> Iterator[str]:
+    # Yields raw chunks as they arrive; callers run sanitize_output on the joined text
+    cache, qv, key, hit = _cache_lookup(prompt, client, temperature, max_tokens, cache_text, cache_context)
+    if hit is not None:
+        yield hit
+        return
+    chunks: list[str] = []
+    for piece in client.chat(_brief_messages(prompt), temperature=temperature, max_tokens=max_tokens, stream=stream):
+        chunks.append(piece)
+        yield piece
+    text = sanitize_output("".join(chunks))
+    if cache is not None and text:
+        cache.add(qv, key, prompt, text)
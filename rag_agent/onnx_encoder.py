@@ -0,0 +1,50 @@
+from __future__ import annotations
+import os
+from typing import List
+import numpy as np
+
+# ONNX Runtime stand-in for the MiniLM SentenceTransformer.
+# Export the model once with scripts/export_minilm_onnx.py, then set
+# RETRIEVER_ONNX_DIR to the output directory to have encoders.get_encoder return it.
+# Requires: onnxruntime, transformers (tokenizer only).
+
+
+class OnnxMiniLM:
+    def __init__(self, model_dir: str, file_name: str = "model_quantized.onnx", max_seq_length: int = 256) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = os.path.join(model_dir, file_name)
+        if not os.path.exists(path):
+            path = os.path.join(model_dir, "model.onnx")  # fall back to the unquantized export
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        available = ort.get_available_providers()
+        providers = [p for p in ("OpenVINOExecutionProvider", "CPUExecutionProvider") if p in available]
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=providers)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = max_seq_length
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        dim = self.session.get_outputs()[0].shape[-1]
+        return dim if isinstance(dim, int) else 384
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True, batch_size: int = 64,
+               convert_to_numpy: bool = True, show_progress_bar: bool = False) -> np.ndarray:
+        out: List[np.ndarray] = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            enc = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length,
+                                 return_tensors="np")
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]  # (B, T, D) last_hidden_state
+            # mean pooling over real tokens, as in the sentence-transformers MiniLM config
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            vecs = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                vecs = vecs / np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+            out.append(vecs.astype(np.float32))
+        if not out:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.concatenate(out, axis=0)
@@ -1,13 +1,69 @@
 from __future__ import annotations
-import json
-from dataclasses import dataclass
-from typing import List, Dict, Any
+import io
+import re
+import hashlib
+from dataclasses import dataclass, field, fields
+from typing import List, Dict, Any, FrozenSet, Tuple
 import numpy as np
 # Removed FAISS dependency; use NumPy for cosine search
 import os
-os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
-from sentence_transformers import SentenceTransformer
+from .encoders import DEFAULT_ENCODER, encoder_id, get_encoder
 from .feedback import get_doc_boosts
+from .jsonio import atomic_write_bytes, loads
+try:
+    from numba import njit
+except ImportError:  # optional; retrieve() falls back to a NumPy expression
+    njit = None
+
+# Opt-in int8 storage of corpus embeddings (per-vector scale); 4x less memory than float32
+RETRIEVER_INT8 = os.environ.get("RETRIEVER_INT8", "0") == "1"
+_SIM_BLOCK = 4096  # rows dequantized per block when scoring int8 embeddings
+
+# Composite precedent score weights: similarity, recency, court level, issue overlap
+_W_SIM, _W_REC, _W_LW, _W_OVL = 0.55, 0.15, 0.2, 0.1
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _score_kernel(sims, recency, lw, overlap, boosts, out):
+        # one fused loop and a single (N,) write instead of a temporary per term
+        for i in range(sims.size):
+            out[i] = _W_SIM*sims[i] + _W_REC*recency[i] + _W_LW*lw[i] + _W_OVL*overlap[i] + boosts[i]
+        return out
+else:
+    _score_kernel = None
+
+# Terms used by the agent to ground claims in retrieved precedents
+KEY_TERMS = ("privacy", "proportionality", "necessity", "safeguards", "biometric", "article 21")
+
+ISSUE_KEYWORDS: Dict[str, List[str]] = {
+    "privacy": ["privacy", "article 21", "fundamental right", "data protection", "personal data"],
+    "proportionality": ["proportionality", "least restrictive", "necessity", "balancing"],
+    "biometric": ["biometric", "aadhaar", "fingerprint", "iris", "face recognition", "facial recognition"],
+    "safeguards": ["safeguards", "oversight", "data protection", "audit", "breach"],
+    "legality": ["statute", "law", "legality", "ultra vires", "backed by law"],
+    # new categories for better variety
+    "religion": ["article 25", "religion", "religious", "hijab", "turban", "kirpan", "faith", "worship"],
+    "expression": ["article 19(1)(a)", "freedom of speech", "expression", "symbolic", "dress", "slogan"],
+    "equality": ["article 14", "equality", "equal", "discrimination", "arbitrary"],
+    "trade": ["article 19(1)(g)", "trade", "business", "commerce", "e-commerce"],
+    "assembly": ["article 19(1)(b)", "protest", "assembly", "demonstration"],
+    "internet": ["internet", "shutdown", "broadband", "telecom"],
+    "localization": ["localization", "data localization", "cross-border", "data transfer"],
+    "surveillance": ["surveillance", "cctv", "public safety", "tracking"],
+}
+
+# One pass over the text instead of a substring scan per phrase. The lookahead lets matches
+# start at every position (like `in`), and longest-first alternation prefers the full phrase.
+# re.ASCII keeps case folding to ASCII so every match lowers back to a table phrase
+# (otherwise e.g. "İ" or "ſ" would match "i"/"s" and miss the lookup).
+_PHRASE_TO_CATS: Dict[str, FrozenSet[str]] = {}
+for _cat, _phrases in ISSUE_KEYWORDS.items():
+    for _p in _phrases:
+        _PHRASE_TO_CATS[_p] = _PHRASE_TO_CATS.get(_p, frozenset()) | {_cat}
+_ISSUE_RE = re.compile(
+    "(?=(" + "|".join(re.escape(p) for p in sorted(_PHRASE_TO_CATS, key=len, reverse=True)) + "))",
+    re.IGNORECASE | re.ASCII,
+)
 
 @dataclass
 class Doc:
@@ -18,75 +74,176 @@ class Doc:
     level_weight: float
     tags: List[str]
     text: str
+    # derived once at load time; not part of the corpus schema
+    kt_hits: FrozenSet[str] = field(default=frozenset(), init=False, repr=False, compare=False)
+    tag_set: FrozenSet[str] = field(default=frozenset(), init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        text_lower = self.text.lower()
+        self.kt_hits = frozenset(k for k in KEY_TERMS if k in text_lower)
+        self.tag_set = frozenset(self.tags)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.init}
 
 class Retriever:
-    def __init__(self, docs: List[Doc], model_name: str = "sentence-transformers/all-MiniLM-L6-v2") -> None:
+    def __init__(self, docs: List[Doc], model_name: str = DEFAULT_ENCODER,
+                 cache_dir: str | None = None) -> None:
         self.docs = docs
-        self.model = SentenceTransformer(model_name)
-        self.embs = self._encode([d.text for d in docs])  # shape (N, D), normalized
+        self.doc_pos = {d.id: i for i, d in enumerate(docs)}  # row in self.embs / self.embs_i8
+        self.model = get_encoder(model_name)  # shared with the LLM semantic cache
+        self._fixed_vecs: Dict[Tuple[str, ...], np.ndarray] = {}
+        self.embs = self._load_or_encode(cache_dir, encoder_id(model_name))  # shape (N, D), normalized
+        self.embs_i8: np.ndarray | None = None
+        if RETRIEVER_INT8:
+            self._quantize()
+        self._build_arrays()
+
+    def _build_arrays(self) -> None:
+        # Structure-of-arrays view of the corpus so all N scores come from a few NumPy ops
+        docs = self.docs
+        self._years = np.array([d.year for d in docs], dtype=np.int32)
+        self._recency_v = self._recency(self._years)  # query-independent, computed once
+        self._lw = np.array([d.level_weight for d in docs], dtype=np.float32)
+        self.tag_index: Dict[str, int] = {}
+        for d in docs:
+            for t in d.tags:
+                self.tag_index.setdefault(t, len(self.tag_index))
+        self._tagmat = np.zeros((len(docs), len(self.tag_index)), dtype=np.uint8)
+        for i, d in enumerate(docs):
+            for t in d.tag_set:
+                self._tagmat[i, self.tag_index[t]] = 1
+        self._boosts = np.zeros(len(docs), dtype=np.float32)
+        self._boosts_src: Dict[str, float] | None = None
+        # (N, len(KEY_TERMS)) mask of which key terms each doc mentions, so grounding needs no string ops at query time
+        self._kt_mask = np.array([[k in d.kt_hits for k in KEY_TERMS] for d in docs], dtype=np.uint8).reshape(
+            len(docs), len(KEY_TERMS))
+
+    def _load_or_encode(self, cache_dir: str | None, encoder_id: str) -> np.ndarray:
+        texts = [d.text for d in self.docs]
+        if not cache_dir:
+            return self._encode(texts)
+        # keyed on encoder + corpus texts so any edit to either re-encodes
+        h = hashlib.sha1(encoder_id.encode("utf-8"))
+        for t in texts:
+            h.update(b"\0" + t.encode("utf-8"))
+        path = os.path.join(cache_dir, f"embs_{h.hexdigest()[:12]}.npy")
+        if os.path.exists(path):
+            try:
+                embs = np.load(path, mmap_mode="r")  # pages shared across processes via the OS cache
+                if embs.shape[0] == len(texts):
+                    return embs
+            except Exception:
+                pass
+        embs = self._encode(texts)
+        try:
+            buf = io.BytesIO()
+            np.save(buf, embs)
+            atomic_write_bytes(path, buf.getvalue())
+        except Exception:
+            pass
+        return embs
+
+    def _quantize(self) -> None:
+        # symmetric per-row scale so the largest component maps to +/-127
+        scale = np.abs(self.embs).max(axis=1, keepdims=True) / 127.0
+        scale[scale == 0] = 1.0
+        self.embs_i8 = np.round(self.embs / scale).astype(np.int8)
+        self.scale = scale[:, 0].astype(np.float32)
+        self.embs = None  # drop the float32 copy
+
+    def _sims(self, qv: np.ndarray) -> np.ndarray:
+        if self.embs_i8 is None:
+            return self.embs @ qv
+        # dequantize a block at a time so the float32 temporary stays bounded
+        out = np.empty(len(self.embs_i8), dtype=np.float32)
+        for start in range(0, len(out), _SIM_BLOCK):
+            blk = self.embs_i8[start:start + _SIM_BLOCK]
+            out[start:start + len(blk)] = (blk.astype(np.float32) @ qv) * self.scale[start:start + len(blk)]
+        return out
+
+    def doc_vectors(self, rows: List[int]) -> np.ndarray:
+        if self.embs_i8 is None:
+            return self.embs[rows]
+        return self.embs_i8[rows].astype(np.float32) * self.scale[rows, None]
 
     def _encode(self, texts: List[str]) -> np.ndarray:
-        vecs = self.model.encode(texts, normalize_embeddings=True)
+        vecs = self.model.encode(texts, normalize_embeddings=True, batch_size=64,
+                                 convert_to_numpy=True, show_progress_bar=False)
         return np.array(vecs, dtype="float32")
 
     def _issue_keywords(self, text: str) -> List[str]:
-        text_l = text.lower()
-        mapping = {
-            "privacy": ["privacy", "article 21", "fundamental right", "data protection", "personal data"],
-            "proportionality": ["proportionality", "least restrictive", "necessity", "balancing"],
-            "biometric": ["biometric", "aadhaar", "fingerprint", "iris", "face recognition", "facial recognition"],
-            "safeguards": ["safeguards", "oversight", "data protection", "audit", "breach"],
-            "legality": ["statute", "law", "legality", "ultra vires", "backed by law"],
-            # new categories for better variety
-            "religion": ["article 25", "religion", "religious", "hijab", "turban", "kirpan", "faith", "worship"],
-            "expression": ["article 19(1)(a)", "freedom of speech", "expression", "symbolic", "dress", "slogan"],
-            "equality": ["article 14", "equality", "equal", "discrimination", "arbitrary"],
-            "trade": ["article 19(1)(g)", "trade", "business", "commerce", "e-commerce"],
-            "assembly": ["article 19(1)(b)", "protest", "assembly", "demonstration"],
-            "internet": ["internet", "shutdown", "broadband", "telecom"],
-            "localization": ["localization", "data localization", "cross-border", "data transfer"],
-            "surveillance": ["surveillance", "cctv", "public safety", "tracking"],
-        }
-        kws: List[str] = []
-        for key, vals in mapping.items():
-            if any(v in text_l for v in vals):
-                kws.append(key)
-        return sorted(set(kws))
-
-    def _issue_overlap(self, tags: List[str], kws: List[str]) -> float:
+        kws = set()
+        for m in _ISSUE_RE.finditer(text):
+            kws.update(_PHRASE_TO_CATS[m.group(1).lower()])
+        return sorted(kws)
+
+    def _issue_overlap(self, kws: FrozenSet[str]) -> np.ndarray:
         if not kws:
-            return 0.0
-        return len(set(tags) & set(kws)) / float(len(set(kws)))
+            return np.zeros(len(self.docs), dtype=np.float32)
+        kw_vec = np.zeros(len(self.tag_index), dtype=np.uint8)
+        for k in kws:
+            j = self.tag_index.get(k)
+            if j is not None:
+                kw_vec[j] = 1
+        # divide by all detected issues, including ones no doc is tagged with
+        return (self._tagmat @ kw_vec).astype(np.float32) / float(len(kws))
+
+    def _recency(self, years: np.ndarray, current_year: int = 2025) -> np.ndarray:
+        age = np.maximum(0, current_year - years)
+        return np.maximum(0.0, 1.0 - (age / 20.0)).astype(np.float32)
 
-    def _recency(self, year: int, current_year: int = 2025) -> float:
-        age = max(0, current_year - year)
-        return max(0.0, 1.0 - (age / 20.0))
+    def _doc_boosts(self) -> np.ndarray:
+        boosts = get_doc_boosts()
+        # feedback.get_doc_boosts returns the same dict until the feedback file changes
+        if boosts is not self._boosts_src:
+            self._boosts = np.array([boosts.get(d.id, 0.0) for d in self.docs], dtype=np.float32)
+            self._boosts_src = boosts
+        return self._boosts
 
-    def _precedent_score(self, sim: float, doc: Doc, kws: List[str]) -> float:
-        a, b, c, d = 0.55, 0.15, 0.2, 0.1
-        base = a*sim + b*self._recency(doc.year) + c*doc.level_weight + d*self._issue_overlap(doc.tags, kws)
-        boost = get_doc_boosts().get(doc.id, 0.0)
-        return float(base + boost)
+    def _precedent_scores(self, sims: np.ndarray, kws: FrozenSet[str]) -> np.ndarray:
+        overlap = self._issue_overlap(kws)
+        boosts = self._doc_boosts()
+        if _score_kernel is not None:
+            # fresh output per call: the retriever is shared across Streamlit sessions
+            out = np.empty(len(self.docs), dtype=np.float32)
+            sims = np.ascontiguousarray(sims, dtype=np.float32)
+            return _score_kernel(sims, self._recency_v, self._lw, overlap, boosts, out)
+        return _W_SIM*sims + _W_REC*self._recency_v + _W_LW*self._lw + _W_OVL*overlap + boosts
 
     def retrieve(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        kws = self._issue_keywords(query)
+        kws = frozenset(self._issue_keywords(query))
         qv = self._encode([query])[0]  # shape (D,)
         # cosine similarity since vectors are normalized
-        sims = (self.embs @ qv).astype(float)  # shape (N,)
-        # top-k indices
+        sims = self._sims(qv)  # shape (N,)
+        scores = self._precedent_scores(sims, kws)  # shape (N,)
+        # top-k indices by composite score
         k = min(k, len(self.docs))
-        idxs = np.argpartition(-sims, kth=k-1)[:k]
+        if k <= 0:
+            return []
+        # partition on the scores directly so no negated (N,) temporary is allocated
+        idxs = np.argpartition(scores, -k)[-k:]
         # sort those by score desc
-        idxs = idxs[np.argsort(-sims[idxs])]
+        idxs = idxs[np.argsort(scores[idxs])[::-1]]
         scored: List[Dict[str, Any]] = []
         for idx in idxs.tolist():
             d = self.docs[idx]
-            score = self._precedent_score(float(sims[idx]), d, kws)
-            scored.append({"score": float(score), **d.__dict__})
+            scored.append({"score": float(scores[idx]), **d.as_dict()})
         return scored
 
+    def encode_fixed(self, texts: Tuple[str, ...]) -> np.ndarray:
+        # Constant texts (e.g. the agent's probe claims) are encoded once per retriever
+        vecs = self._fixed_vecs.get(texts)
+        if vecs is None:
+            vecs = self._fixed_vecs[texts] = self._encode(list(texts))
+        return vecs
+
+    def warmup(self) -> None:
+        # Pay one-time kernel/allocator setup before the first real query (single-query encode)
+        self.retrieve("warmup query about privacy and proportionality", k=1)
+
     @staticmethod
     def load_docs(path: str) -> List[Doc]:
-        with open(path, "r") as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            data = loads(f.read())
         return [Doc(**obj) for obj in data]
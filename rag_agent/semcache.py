@@ -0,0 +1,110 @@
+from __future__ import annotations
+import os
+import io
+import hashlib
+import threading
+from typing import Any, List, Tuple
+import numpy as np
+from .encoders import get_encoder
+from .jsonio import atomic_write_bytes, dumps, loads
+
+# Semantic cache for LLM completions (opt-in).
+# The case text (title + facts) is embedded with the shared MiniLM encoder (see encoders.py).
+# A stored completion is reused when its case embedding is within threshold AND its exact
+# key matches: model, temperature, max_tokens and a sha1 of the rest of the prompt (style
+# prefix and precedents), so only a near-identical case with the same context is served.
+# Environment variables:
+# - SEMCACHE (default: 0; set to 1 to enable)
+# - SEMCACHE_PATH (default: legal_semcache -> legal_semcache.npz)
+# - SEMCACHE_THRESHOLD (default: 0.97)
+
+SEMCACHE_ENABLED = os.environ.get("SEMCACHE", "0") == "1"
+SEMCACHE_PATH = os.environ.get("SEMCACHE_PATH", "legal_semcache")
+try:
+    SEMCACHE_THRESHOLD = float(os.environ.get("SEMCACHE_THRESHOLD", "0.97"))
+except ValueError:
+    SEMCACHE_THRESHOLD = 0.97
+
+
+class SemanticCache:
+    def __init__(self, encoder: Any, path: str = SEMCACHE_PATH, threshold: float = SEMCACHE_THRESHOLD) -> None:
+        self.encoder = encoder
+        self.path = path
+        self.threshold = threshold
+        dim = int(encoder.get_sentence_embedding_dimension() or 384)
+        self.embs = np.zeros((0, dim), dtype="float32")  # shape (N, D), normalized
+        self.entries: List[Tuple[str, str, str]] = []  # parallel (key, prompt, response)
+        self._lock = threading.Lock()
+        self._mtime: int | None = None
+        self._load()
+
+    def _load(self) -> None:
+        # vectors and entries live in one .npz, rewritten atomically, so the two can never disagree
+        npz = f"{self.path}.npz"
+        try:
+            mtime = os.stat(npz).st_mtime_ns
+            with np.load(npz) as z:
+                embs = z["embs"].astype("float32")
+                entries = [tuple(e) for e in loads(z["entries"].tobytes())]
+        except Exception:
+            return
+        self._mtime = mtime
+        if (embs.ndim == 2 and embs.shape[0] == len(entries) and embs.shape[1] == self.embs.shape[1]
+                and all(len(e) == 3 for e in entries)):
+            self.embs = embs
+            self.entries = entries
+
+    def encode(self, text: str) -> np.ndarray:
+        vec = self.encoder.encode([text], normalize_embeddings=True)[0]
+        return np.asarray(vec, dtype="float32")
+
+    def lookup(self, qv: np.ndarray, key: str) -> str | None:
+        with self._lock:
+            if not self.entries:
+                return None
+            sims = self.embs @ qv  # cosine similarity since vectors are normalized
+            cand = np.flatnonzero(sims >= self.threshold)
+            # closest first, but only an exact key match may be served
+            for i in cand[np.argsort(-sims[cand])].tolist():
+                if self.entries[i][0] == key:
+                    return self.entries[i][2]
+            return None
+
+    def add(self, qv: np.ndarray, key: str, prompt: str, response: str) -> None:
+        with self._lock:
+            # pick up entries another process saved since our last load before rewriting the file
+            try:
+                if os.stat(f"{self.path}.npz").st_mtime_ns != self._mtime:
+                    self._load()
+            except OSError:
+                pass
+            self.embs = np.vstack([self.embs, qv[None, :].astype("float32")])
+            self.entries.append((key, prompt, response))
+            try:
+                buf = io.BytesIO()
+                np.savez(buf, embs=self.embs,
+                         entries=np.frombuffer(dumps([list(e) for e in self.entries], indent=False), dtype=np.uint8))
+                atomic_write_bytes(f"{self.path}.npz", buf.getvalue())
+                self._mtime = os.stat(f"{self.path}.npz").st_mtime_ns
+            except Exception:
+                pass
+
+
+def cache_key(model: str, temperature: float, max_tokens: int, context: str) -> str:
+    return f"{model}|{float(temperature)}|{int(max_tokens)}|{hashlib.sha1(context.encode('utf-8')).hexdigest()}"
+
+
+_SEMCACHE: SemanticCache | None = None
+_SEMCACHE_LOCK = threading.Lock()
+
+
+def get_semcache() -> SemanticCache | None:
+    # Built on first use with the shared encoder, so it reuses the retriever's loaded model
+    global _SEMCACHE
+    if not SEMCACHE_ENABLED:
+        return None
+    if _SEMCACHE is None:
+        with _SEMCACHE_LOCK:
+            if _SEMCACHE is None:
+                _SEMCACHE = SemanticCache(get_encoder())
+    return _SEMCACHE
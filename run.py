@@ -1,13 +1,13 @@
 import os
-import json
 from pathlib import Path
 from datetime import datetime
 import sys
 
 from rag_agent.retriever import Retriever
-from rag_agent.agent import CaseFile, run_agent
-from rag_agent.llm import NvidiaChatClient
+from rag_agent.agent import CaseFile, analyze_and_stream, warmup_agent
+from rag_agent.llm import NvidiaChatClient, sanitize_output
 from rag_agent.agent import submit_feedback
+from rag_agent.jsonio import atomic_write_bytes, dumps
 
 ROOT = Path(__file__).parent
 DATA = ROOT / "data" / "corpus.json"
@@ -32,7 +32,8 @@ case_2025 = CaseFile(
 def main():
     # Prepare retriever
     docs = Retriever.load_docs(str(DATA))
-    retriever = Retriever(docs)
+    retriever = Retriever(docs, cache_dir=str(DATA.parent))
+    warmup_agent(retriever)
 
     # NVIDIA client
     client = NvidiaChatClient()
@@ -48,8 +49,11 @@ def main():
         max_toks = 1700
     style_pref = os.environ.get("LIA_STYLE")  # "bullets" | "prose" | None
 
-    # Run agent
-    result = run_agent(retriever, case_2025, client, temperature=temp, max_tokens=max_toks, style_preference=style_pref)
+    # Run agent; the draft request goes out while grounding runs and is streamed below.
+    # Stream to a terminal as tokens arrive; when piped (e.g. to head) fetch in one go to avoid BrokenPipe
+    live = sys.stdout.isatty()
+    result, draft_chunks = analyze_and_stream(retriever, case_2025, client, temperature=temp, max_tokens=max_toks,
+                                              style_preference=style_pref, stream=live)
 
     try:
         # Print concise console view
@@ -73,7 +77,18 @@ def main():
                     print(f"  • {ev['source']}: {ev['snippet']}")
 
         print("\nDraft:\n")
-        print(result["draft"])
+        sys.stdout.flush()
+        pieces = []
+        for piece in draft_chunks:
+            pieces.append(piece)
+            if live:
+                sys.stdout.write(piece)
+                sys.stdout.flush()
+        result["draft"] = sanitize_output("".join(pieces))
+        if live:
+            print()
+        else:
+            print(result["draft"])
 
         print("\nSuggested verdict confidence:", result["confidence"]) 
         sys.stdout.flush()
@@ -95,10 +110,11 @@ def main():
         except Exception:
             pass
     finally:
-        # Save a JSON and a txt snapshot
-        ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        (OUTPUT_DIR / f"result_{ts}.json").write_text(json.dumps(result, indent=2))
-        (OUTPUT_DIR / f"result_{ts}.txt").write_text(result["draft"]) 
+        # Save a JSON and a txt snapshot (none if drafting failed)
+        if result["draft"]:
+            ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+            atomic_write_bytes(OUTPUT_DIR / f"result_{ts}.json", dumps(result))
+            atomic_write_bytes(OUTPUT_DIR / f"result_{ts}.txt", result["draft"].encode("utf-8"))
 
 if __name__ == "__main__":
     main()
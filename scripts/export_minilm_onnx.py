@@ -0,0 +1,35 @@
+# One-time export of the retriever's MiniLM encoder to ONNX + int8 dynamic quantization.
+# Usage:
+#   pip install "optimum[onnxruntime]"
+#   python scripts/export_minilm_onnx.py --out models/minilm-onnx [--arch avx2|avx512_vnni|arm64]
+#   export RETRIEVER_ONNX_DIR=models/minilm-onnx
+import argparse
+
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=MODEL)
+    ap.add_argument("--out", default="models/minilm-onnx")
+    ap.add_argument("--arch", default="avx2", choices=["avx2", "avx512", "avx512_vnni", "arm64"])
+    args = ap.parse_args()
+
+    # export with dynamic batch/sequence axes -> <out>/model.onnx
+    model = ORTModelForFeatureExtraction.from_pretrained(args.model, export=True)
+    model.save_pretrained(args.out)
+    AutoTokenizer.from_pretrained(args.model).save_pretrained(args.out)
+
+    # int8 dynamic quantization -> <out>/model_quantized.onnx
+    qconfig = getattr(AutoQuantizationConfig, args.arch)(is_static=False, per_channel=False)
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantizer.quantize(save_dir=args.out, quantization_config=qconfig)
+    print(f"Exported {args.model} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()